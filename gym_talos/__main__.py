@@ -4,13 +4,19 @@ import pathlib
 import signal
 
 import torch
-import yaml
 from stable_baselines3 import HerReplayBuffer, SAC
 
 from .envs.env_talos_deburring_her import EnvTalosDeburringHer
 
 from .utils.custom_callbacks import AllCallbacks
-from .utils.loader_and_saver import saver, handler, setup_model, setup_env
+from .utils.loader_and_saver import (
+    saver,
+    handler,
+    setup_model,
+    setup_env,
+    make_env,
+    load_config,
+)
 
 ################
 # Main HER SAC #
@@ -50,8 +56,7 @@ config_filename = pathlib.Path(args.configurationFile)
 training_id = args.identication
 
 # Parsing configuration file
-with config_filename.open() as config_file:
-    params = yaml.safe_load(config_file)
+params = load_config(config_filename)
 
 designer_params = params["robot_designer"]
 params_training = params["training"]
@@ -84,6 +89,12 @@ model_params = params["SAC"]
 
 replay_buffer_class = HerReplayBuffer
 
+nb_eval_environments = env_params.get("nb_eval_environments", 1)
+eval_seed = env_params.get("seed")
+if eval_seed is not None:
+    # Evaluation environments come after the training ones
+    eval_seed += env_params["nb_environments"]
+
 env_training = setup_env(
     env_class=env_class,
     env_params=env_params,
@@ -102,7 +113,12 @@ callback_class = AllCallbacks(
     stats_window_size=100,
     check_freq=1000,
     verbose=1,
-    env=env_training,
+    eval_env_fns=[
+        make_env(env_class, env_params, designer_params, rank=i, seed=eval_seed)
+        for i in range(nb_eval_environments)
+    ],
+    params_env=env_params,
+    eval_seed=eval_seed,
 )
 # Callback function to save the model when CTRL+C is pressed
 signal.signal(
@@ -1,9 +1,9 @@
 from pathlib import Path
 
-import yaml
 from stable_baselines3 import SAC
 
 from .envs.env_talos_deburring_her import EnvTalosDeburringHer
+from .utils.loader_and_saver import load_config
 
 training_name = "2023-07-17_pf_train_2"
 train_name = "_".join(training_name.split("_")[:-1])
@@ -12,8 +12,7 @@ train_name = "_".join(training_name.split("_")[:-1])
 log_dir = Path("logs_pf")
 model_path = log_dir / training_name / "best_model.zip"
 config_path = log_dir / training_name / f"{train_name}.yaml"
-with config_path.open() as config_file:
-    params = yaml.safe_load(config_file)
+params = load_config(config_path)
 
 envDisplay = EnvTalosDeburringHer(
     params["robot_designer"],
@@ -21,17 +20,21 @@ envDisplay = EnvTalosDeburringHer(
     GUI=True,
 )
 
-model = SAC.load(model_path, env=envDisplay)
+# Models trained before the observation space was switched to float32 are only
+# compatible with the environment once it is replaced by the current one
+model = SAC.load(
+    model_path,
+    env=envDisplay,
+    custom_objects={"observation_space": envDisplay.observation_space},
+)
+
+# Shorter rollouts than during training
+envDisplay.maxStep = 500
 
-envDisplay.maxTime = 500
+# Vectorized env built by SB3 around envDisplay, it resets it when a rollout is done
+vecEnvDisplay = model.get_env()
 
+obs = vecEnvDisplay.reset()
 while True:
-    obs, info = envDisplay.reset()
-    done = False
-    i = 0
-    while not done:
-        i += 1
-        action, _ = model.predict(obs, deterministic=True)
-        obs, reward, terminated, truncated, _ = envDisplay.step(action)
-        if terminated or truncated or i > 500:
-            done = True
+    action, _ = model.predict(obs, deterministic=True)
+    obs, reward, done, info = vecEnvDisplay.step(action)
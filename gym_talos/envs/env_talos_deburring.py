@@ -210,7 +210,7 @@ class EnvTalosDeburring(gym.Env):
         """
         self.timer += 1
         if self.timer == 1:
-            self.initialPos = self.pinWrapper.get_end_effector_pos()
+            self.initialPos = self.pinWrapper.get_end_effector_pos().copy()
         torques = self._scaleAction(action)
 
         for _ in range(self.numSimulationSteps):
@@ -1,14 +1,33 @@
+import math
+
 import gymnasium as gym
 import numpy as np
-import collections
 from gym_talos.simulator.bullet_Talos import TalosDeburringSimulator
 
 from ..utils.modelLoader import TalosDesigner
 from ..utils.create_target import TargetGoal
+from ..utils.kernels import reward_kernel, truncation_kernel
 
 
 class EnvTalosDeburringHer(gym.Env):
-    def __init__(self, params_designer, params_env, GUI=False) -> None:
+    # Values of the parameters that can be omitted from params_env
+    _default_params_env = {
+        "randomInit": False,
+        "limitPosScale": 10,
+        "limitVelScale": 30,
+        "torqueScaleCoeff": 1,
+        "lowerLimitPos": [-0.5, -0.5, 0.9],
+        "upperLimitPos": [0.5, 0.5, 1.5],
+        "thresholdSuccess": 0.05,
+        "w_target_reached": 5,
+        "w_joints_to_init": None,
+        "rewardType": "dense",
+        "w_alive": 1,
+        "onTargetSteps": 30,
+        "autoReset": False,
+    }
+
+    def __init__(self, params_designer, params_env, GUI=False, seed=None) -> None:
         """Defines the EnvTalosDeburring class
 
         Defines an interface a robot designer to handle interactions with pinocchio,
@@ -19,12 +38,20 @@ class EnvTalosDeburringHer(gym.Env):
             params_designer: kwargs for the robot designer
             params_env: kwargs for the environment
             GUI: set to true to activate display. Defaults to False.
+            seed: seed of the PRNG used to sample targets and initial configurations.
+                Each process of a vectorized environment must be given its own seed.
+                Defaults to None.
         """
+        if seed is not None:
+            super().reset(seed=seed)
         self._init_parameters(params_env, GUI)
+        self._init_rewardCoefficients()
         if self.reward_type == "dense":
             self.compute_reward = self.compute_reward_dense
+            self._scalar_reward = self._scalar_reward_dense
         elif self.reward_type == "sparse":
             self.compute_reward = self.compute_reward_sparse
+            self._scalar_reward = self._scalar_reward_sparse
         # Robot Designer
         self.pinWrapper = TalosDesigner(
             URDF=params_designer["URDF"],
@@ -51,17 +78,17 @@ class EnvTalosDeburringHer(gym.Env):
 
         # Penalization for truncation of torsos
         self.order_positions = self.simulator.dict_pos
-        self.mat_dt_init = np.zeros(self.rmodel.nq)
+        # Diagonal of the weight matrix of the distance to the initial configuration
+        self.weights_dt_init = np.zeros(self.rmodel.nq)
         if self.weight_joints_to_init is not None:
             for key, value in self.weight_joints_to_init.items():
-                self.mat_dt_init[self.order_positions[key]] = value
-        self.mat_dt_init = np.diag(self.mat_dt_init)
+                self.weights_dt_init[self.order_positions[key]] = value
 
         action_dimension = self.rmodel.nq
         observation_dimension = len(self.simulator.getRobotState())
         self._init_env_variables(action_dimension, observation_dimension)
 
-    def _init_parameters(self, params_env, GUI):  # noqa: C901
+    def _init_parameters(self, params_env, GUI):
         """Load environment parameters from provided dictionnary
 
         Args:
@@ -82,50 +109,22 @@ class EnvTalosDeburringHer(gym.Env):
         self.weight_command = params_env["w_control_reg"]
         self.weight_truncation = params_env["w_penalization_truncation"]
         self.GUI = GUI
-        try:
-            self.random_init_robot = params_env["randomInit"]
-        except KeyError:
-            self.random_init_robot = False
-        try:
-            self.limitPosScale = params_env["limitPosScale"]
-        except KeyError:
-            self.limitPosScale = 10
-        try:
-            self.limitVelScale = params_env["limitVelScale"]
-        except KeyError:
-            self.limitVelScale = 30
-        try:
-            self.torqueScaleCoeff = params_env["torqueScaleCoeff"]
-        except KeyError:
-            self.torqueScaleCoeff = 1
-        try:
-            self.lowerLimitPos = params_env["lowerLimitPos"]
-        except KeyError:
-            self.lowerLimitPos = [-0.5, -0.5, 0.9]
-        try:
-            self.upperLimitPos = params_env["upperLimitPos"]
-        except KeyError:
-            self.upperLimitPos = [0.5, 0.5, 1.5]
-        try:
-            self.threshold_success = params_env["thresholdSuccess"]
-        except KeyError:
-            self.threshold_success = 0.05
-        try:
-            self.weight_target_reached = params_env["w_target_reached"]
-        except KeyError:
-            self.weight_target_reached = 5
-        try:
-            self.weight_joints_to_init = params_env["w_joints_to_init"]
-        except KeyError:
-            self.weight_joints_to_init = None
-        try:
-            self.reward_type = params_env["rewardType"]
-        except KeyError:
-            self.reward_type = "dense"
-        try:
-            self.weight_alive = params_env["w_alive"]
-        except KeyError:
-            self.weight_alive = 1
+
+        #   Optional parameters
+        params = {**self._default_params_env, **params_env}
+        self.random_init_robot = params["randomInit"]
+        self.limitPosScale = params["limitPosScale"]
+        self.limitVelScale = params["limitVelScale"]
+        self.torqueScaleCoeff = params["torqueScaleCoeff"]
+        self.lowerLimitPos = params["lowerLimitPos"]
+        self.upperLimitPos = params["upperLimitPos"]
+        self.threshold_success = params["thresholdSuccess"]
+        self.weight_target_reached = params["w_target_reached"]
+        self.weight_joints_to_init = params["w_joints_to_init"]
+        self.reward_type = params["rewardType"]
+        self.weight_alive = params["w_alive"]
+        self.steps_on_target_success = params["onTargetSteps"]
+        self.auto_reset = params["autoReset"]
 
     def _init_env_variables(self, action_dimension, observation_dimension):
         """Initialize internal variables of the environment
@@ -136,7 +135,7 @@ class EnvTalosDeburringHer(gym.Env):
         """
         self.timer = 0
         self.on_target = 0
-        self.target.create_target()
+        self.target.create_target(self.np_random)
         self.maxStep = int(
             self.maxTime / (self.timeStepSimulation * self.numSimulationSteps),
         )
@@ -147,6 +146,18 @@ class EnvTalosDeburringHer(gym.Env):
             self._init_targetNormalizer()
 
         self.torqueScale = self.torqueScaleCoeff * np.array(self.rmodel.effortLimit)
+        # Scaled limits of the model used to check truncation
+        self._nq = self.rmodel.nq
+        self._nv = self.rmodel.nv
+        self._upperPosLim = self.limitPosScale * np.array(
+            self.rmodel.upperPositionLimit,
+        )
+        self._lowerPosLim = self.limitPosScale * np.array(
+            self.rmodel.lowerPositionLimit,
+        )
+        self._velLim = self.limitVelScale * np.array(self.rmodel.velocityLimit)
+        self._lowerLimitPos = np.array(self.lowerLimitPos, dtype=np.float64)
+        self._upperLimitPos = np.array(self.upperLimitPos, dtype=np.float64)
         action_dim = action_dimension
         self.action_space = gym.spaces.Box(
             low=-1,
@@ -165,19 +176,19 @@ class EnvTalosDeburringHer(gym.Env):
             low=-limit,
             high=limit,
             shape=(observation_dimension,),
-            dtype=np.float64,
+            dtype=np.float32,
         )
         self.observation_space.spaces["achieved_goal"] = gym.spaces.Box(
             low=-limit,
             high=limit,
             shape=(len(self.target.position_target),),
-            dtype=np.float64,
+            dtype=np.float32,
         )
         self.observation_space.spaces["desired_goal"] = gym.spaces.Box(
             low=-limit,
             high=limit,
             shape=(len(self.target.position_target),),
-            dtype=np.float64,
+            dtype=np.float32,
         )
 
     def close(self):
@@ -201,19 +212,20 @@ class EnvTalosDeburringHer(gym.Env):
         Returns:
             Observation of the initial state.
         """
+        super().reset(seed=seed)
         self.timer = 0
         self.on_target = 0
         if options is None:
-            self.target.create_target()
+            self.target.create_target(self.np_random)
         elif "target" in options.keys():
-            self.target.position_target = options["target"]
-        self.simulator.reset(self.target.position_target)  # Reset simulator
+            self.target.position_target = np.asarray(options["target"])
+        # Reset simulator
+        self.simulator.reset(self.target.position_target, np_random=self.np_random)
         x_measured = self.simulator.getRobotState()
         self.pinWrapper.update_reduced_model(x_measured, self.simulator.getRobotPos())
+        to_target = self.pinWrapper.get_end_effector_pos() - self.target.position_target
         infos = {
-            "dst": np.linalg.norm(
-                self.pinWrapper.get_end_effector_pos() - self.target.position_target,
-            ),
+            "dst": math.sqrt(to_target @ to_target),
             "tor": 0,
             "init": 0,
         }
@@ -227,6 +239,13 @@ class EnvTalosDeburringHer(gym.Env):
         The model of the robot is updated using the observation taken from the
         environment.
         The termination and condition are checked and the reward is computed.
+        If autoReset is set, the environment is reset as soon as the rollout is done:
+        the last observation and infos are stored in infos["final_observation"] and
+        infos["final_info"] and the observation and infos of the new rollout are
+        returned.
+        It must stay disabled when the environment is wrapped by a SB3 VecEnv, which
+        already resets it.
+
         Args:
             action: Normalized action vector
 
@@ -235,18 +254,19 @@ class EnvTalosDeburringHer(gym.Env):
             Reward
             Boolean indicating this rollout is done
         """
+        simulator = self.simulator
+        pinWrapper = self.pinWrapper
         self.timer += 1
         torques = self._scaleAction(action)
 
-        for _ in range(self.numSimulationSteps):
-            self.simulator.step(torques)
-        x_measured = self.simulator.getRobotState()
-        self.pinWrapper.update_reduced_model(x_measured, self.simulator.getRobotPos())
+        simulator.stepMultiple(torques, self.numSimulationSteps)
+        x_measured = simulator.getRobotState()
+        pinWrapper.update_reduced_model(x_measured, simulator.getRobotPos())
         # if self.GUI:
         #     # self.simulator.createBaseRobotVisual(
         #     # self.pinWrapper.get_end_effector_pos())
         #     pass
-        self.rCoM = self.pinWrapper.get_CoM()
+        self.rCoM = pinWrapper.get_CoM()
         ob = self._getObservation(x_measured)  # position velocity joint and goal
         truncated = self._checkTruncation(x_measured)
         reward, infos = self._reward(torques, ob, truncated)
@@ -254,6 +274,11 @@ class EnvTalosDeburringHer(gym.Env):
         terminated = self._checkTermination()
         if terminated or truncated:
             infos["is_success"] = self._checkSuccess()
+            if self.auto_reset:
+                final_observation, final_info = ob, infos
+                ob, infos = self.reset()
+                infos["final_observation"] = final_observation
+                infos["final_info"] = final_info
         return ob, reward, terminated, truncated, infos
 
     def _getObservation(self, x_measured):
@@ -267,19 +292,23 @@ class EnvTalosDeburringHer(gym.Env):
         Returns:
             Fromated observations
         """
-        final_obs = gym.spaces.Dict()
+        # Observations are float32, as used by the policy and stored by the buffer
+        x_measured = x_measured.astype(np.float32)
+        end_effector_pos = self.pinWrapper.get_end_effector_pos().astype(np.float32)
+        position_target = self.target.position_target.astype(np.float32)
         if self.normalizeObs:
             observation = self._obsNormalizer(x_measured)
-            achieved_goal = self._goalNormalizer(self.pinWrapper.get_end_effector_pos())
-            desired_goal = self._targetNormalizer(self.target.position_target)
+            achieved_goal = self._goalNormalizer(end_effector_pos)
+            desired_goal = self._targetNormalizer(position_target)
         else:
             observation = x_measured
-            achieved_goal = self.pinWrapper.get_end_effector_pos()
-            desired_goal = self.target.position_target
-        final_obs.spaces["observation"] = np.array(observation)
-        final_obs.spaces["achieved_goal"] = np.array(achieved_goal)
-        final_obs.spaces["desired_goal"] = np.array(desired_goal)
-        return collections.OrderedDict(final_obs)
+            achieved_goal = end_effector_pos
+            desired_goal = position_target
+        return {
+            "observation": observation,
+            "achieved_goal": achieved_goal,
+            "desired_goal": desired_goal,
+        }
 
     def _reward(self, torques, ob, truncated):
         """Compute step reward
@@ -299,36 +328,66 @@ class EnvTalosDeburringHer(gym.Env):
         Returns:
             Scalar reward
         """
-        len_to_init = np.sum(
-            (self.simulator.qC0 - ob["observation"][: self.rmodel.nq]).T
-            * self.mat_dt_init
-            * (self.simulator.qC0 - ob["observation"][: self.rmodel.nq]),
+        torque_norm, len_to_init, dst = reward_kernel(
+            ob["observation"][: self._nq],
+            self.simulator.qC0,
+            self.weights_dt_init,
+            torques,
+            ob["achieved_goal"],
+            ob["desired_goal"],
         )
-        dst = np.linalg.norm(ob["achieved_goal"] - ob["desired_goal"])
 
         bool_check = dst < self.threshold_success
         infos = {}
-        infos["param_rew"] = np.array(
-            [np.linalg.norm(torques), len_to_init, not truncated],
-        )
-        infos["tor"] = np.linalg.norm(torques)
+        infos["param_rew"] = np.array([torque_norm, len_to_init, not truncated])
+        infos["tor"] = torque_norm
         infos["init"] = len_to_init
         infos["dst"] = dst
         infos["on_target"] = bool_check
-        ach_goal = np.empty((1, 3))
-        des_goal = np.empty((1, 3))
-        ach_goal[0, :] = ob["achieved_goal"]
-        des_goal[0, :] = ob["desired_goal"]
-        reward = float(
-            self.compute_reward(
-                achieved_goal=ach_goal,
-                desired_goal=des_goal,
-                info=np.array([infos]),
-            ),
-        )
+        reward = self._scalar_reward(torque_norm, len_to_init, truncated, dst)
 
         return reward, infos
 
+    def _scalar_reward_sparse(self, torque_norm, len_to_init, truncated, dst):
+        """Computes the sparse reward of a single step
+
+        Equivalent to compute_reward_sparse for a batch of size 1.
+
+        Args:
+            torque_norm: norm of the torque vector
+            len_to_init: weighted distance to the initial configuration
+            truncated: truncation bool
+            dst: distance of the end-effector to the target
+
+        Returns:
+            Scalar reward
+        """
+        return float(
+            -self.weight_command * torque_norm
+            + self.weight_target_reached * ((dst < self.threshold_success) - 0.002),
+        )
+
+    def _scalar_reward_dense(self, torque_norm, len_to_init, truncated, dst):
+        """Computes the dense reward of a single step
+
+        Equivalent to compute_reward_dense for a batch of size 1.
+
+        Args:
+            torque_norm: norm of the torque vector
+            len_to_init: weighted distance to the initial configuration
+            truncated: truncation bool
+            dst: distance of the end-effector to the target
+
+        Returns:
+            Scalar reward
+        """
+        return float(
+            -self.weight_command * torque_norm
+            - len_to_init
+            + self.weight_truncation * (not truncated)
+            - self.weight_target * dst,
+        )
+
     def _checkTermination(self):
         """Check the termination conditions.
 
@@ -341,7 +400,9 @@ class EnvTalosDeburringHer(gym.Env):
         Returns:
             True if the environment has been terminated, False otherwise
         """
-        return self.timer > (self.maxStep - 1) or self.on_target > 30
+        return (
+            self.timer >= self.maxStep or self.on_target > self.steps_on_target_success
+        )
 
     def _checkTruncation(self, x_measured):
         """Checks the truncation conditions.
@@ -361,24 +422,16 @@ class EnvTalosDeburringHer(gym.Env):
         Returns:
             True if the environment has been truncated, False otherwise.
         """
-        # Balance
-        truncation_balance = (self.rCoM < self.lowerLimitPos).any() or (
-            self.rCoM > self.upperLimitPos
-        ).any()
-        # Limits
-        truncation_limits_position = (
-            x_measured[: self.rmodel.nq]
-            > self.limitPosScale * self.rmodel.upperPositionLimit
-        ).any() or (
-            x_measured[: self.rmodel.nq]
-            < self.limitPosScale * self.rmodel.lowerPositionLimit
-        ).any()
-        truncation_limits_speed = (
-            np.abs(x_measured[-self.rmodel.nv :])
-            > self.limitVelScale * self.rmodel.velocityLimit
-        ).any()
-        truncation_limits = truncation_limits_position or truncation_limits_speed
-        return truncation_limits or truncation_balance
+        return truncation_kernel(
+            x_measured[: self._nq],
+            x_measured[-self._nv :],
+            self._upperPosLim,
+            self._lowerPosLim,
+            self._velLim,
+            self.rCoM,
+            self._lowerLimitPos,
+            self._upperLimitPos,
+        )
 
     def _checkSuccess(self):
         """Checks the success conditions.
@@ -392,7 +445,7 @@ class EnvTalosDeburringHer(gym.Env):
         Returns:
             True if the environment has been successful, False otherwise.
         """
-        return self.on_target > 30
+        return self.on_target > self.steps_on_target_success
 
     def _scaleAction(self, action):
         """Scales normalized actions to obtain robot torques
@@ -423,6 +476,9 @@ class EnvTalosDeburringHer(gym.Env):
 
         self.avgObs = (self.upperObsLim + self.lowerObsLim) / 2
         self.diffObs = self.upperObsLim - self.lowerObsLim
+        # (x - avg) / diff is evaluated as x * invDiff + bias
+        self.invDiffObs = (1 / self.diffObs).astype(np.float32)
+        self.biasObs = (-self.avgObs / self.diffObs).astype(np.float32)
 
     def _init_goalNormalizer(self):
         """Initializes the goal normalizer using robot model limits"""
@@ -430,6 +486,8 @@ class EnvTalosDeburringHer(gym.Env):
         self.upperGoalLim = 3 * np.ones(3)
         self.avgGoal = (self.upperGoalLim + self.lowerGoalLim) / 2
         self.diffGoal = self.upperGoalLim - self.lowerGoalLim
+        self.invDiffGoal = (1 / self.diffGoal).astype(np.float32)
+        self.biasGoal = (-self.avgGoal / self.diffGoal).astype(np.float32)
 
     def _init_targetNormalizer(self):
         """Initializes the target normalizer using robot model limits"""
@@ -437,6 +495,8 @@ class EnvTalosDeburringHer(gym.Env):
         self.upperGoalLim = 3 * np.ones(3)
         self.avgGoal = (self.upperGoalLim + self.lowerGoalLim) / 2
         self.diffGoal = self.upperGoalLim - self.lowerGoalLim
+        self.invDiffGoal = (1 / self.diffGoal).astype(np.float32)
+        self.biasGoal = (-self.avgGoal / self.diffGoal).astype(np.float32)
 
     def _goalNormalizer(self, goal):
         """Normalizes the goal
@@ -447,7 +507,7 @@ class EnvTalosDeburringHer(gym.Env):
         Returns:
             normalized goal
         """
-        return (goal - self.avgGoal) / self.diffGoal
+        return goal * self.invDiffGoal + self.biasGoal
 
     def _obsNormalizer(self, x_measured):
         """Normalizes the observation taken from the simulator
@@ -458,7 +518,7 @@ class EnvTalosDeburringHer(gym.Env):
         Returns:
             normalized observation
         """
-        return (x_measured - self.avgObs) / self.diffObs
+        return x_measured * self.invDiffObs + self.biasObs
 
     def _targetNormalizer(self, target):
         """Normalizes the target
@@ -469,7 +529,50 @@ class EnvTalosDeburringHer(gym.Env):
         Returns:
             normalized target
         """
-        return (target - self.avgGoal) / self.diffGoal
+        return target * self.invDiffGoal + self.biasGoal
+
+    def _init_rewardCoefficients(self):
+        """Initializes the coefficients weighting the terms of the rewards"""
+        self.coeff_sparse = np.array(
+            [
+                [
+                    -self.weight_command,
+                    # -1,
+                    # self.weight_alive,
+                    # 0,
+                    0,
+                    0,
+                    self.weight_target_reached,
+                ],
+            ],
+        ).T
+        self.coeff_dense = np.array(
+            [
+                [
+                    -self.weight_command,
+                    # corresponds to the command penalization
+                    -1,
+                    # corresponds to the lenght to init penalization
+                    self.weight_truncation,
+                    # corresponds to the truncation penalization
+                    -self.weight_target,
+                    # corresponds to the distance to target
+                ],
+            ],
+        ).T
+
+    def _stack_param_rew(self, info):
+        """Gathers the reward parameters of a batch of infos
+
+        Args:
+            info: array of infos dictionaries, or (B, 3) array of reward parameters
+
+        Returns:
+            (B, 3) array of reward parameters
+        """
+        if isinstance(info, np.ndarray) and info.dtype != object:
+            return info.reshape(-1, 3)
+        return np.stack([inf["param_rew"] for inf in np.ravel(info)])
 
     def compute_reward_sparse(
         self,
@@ -490,31 +593,14 @@ class EnvTalosDeburringHer(gym.Env):
         :return: the corresponding reward
         """
         dst = np.array([np.linalg.norm(achieved_goal - desired_goal, axis=-1)]).T
-        coeff_matrix = np.array(
-            [
-                [
-                    -self.weight_command,
-                    # -1,
-                    # self.weight_alive,
-                    # 0,
-                    0,
-                    0,
-                    self.weight_target_reached,
-                ],
-            ],
-        ).T
-        info_matrix = np.empty((achieved_goal.shape[0], 3))
-
-        for i, inf in enumerate(info):
-            info_matrix[i] = inf["param_rew"]
         info_matrix = np.concatenate(
             (
-                info_matrix,
+                self._stack_param_rew(info),
                 (dst < self.threshold_success).astype(int) - 0.002 * np.ones_like(dst),
             ),
             axis=1,
         )
-        return info_matrix @ coeff_matrix
+        return info_matrix @ self.coeff_sparse
 
     def compute_reward_dense(
         self,
@@ -523,26 +609,8 @@ class EnvTalosDeburringHer(gym.Env):
         info: dict,
     ) -> float:
         dst = np.array([np.linalg.norm(achieved_goal - desired_goal, axis=-1)]).T
-        coeff_matrix = np.array(
-            [
-                [
-                    -self.weight_command,
-                    # corresponds to the command penalization
-                    -1,
-                    # corresponds to the lenght to init penalization
-                    self.weight_truncation,
-                    # corresponds to the truncation penalization
-                    -self.weight_target,
-                    # corresponds to the distance to target
-                ],
-            ],
-        ).T
-        info_matrix = np.empty((achieved_goal.shape[0], 3))
-
-        for i, inf in enumerate(info):
-            info_matrix[i] = inf["param_rew"]
         info_matrix = np.concatenate(
-            (info_matrix, dst),
+            (self._stack_param_rew(info), dst),
             axis=1,
         )
-        return info_matrix @ coeff_matrix
+        return info_matrix @ self.coeff_dense
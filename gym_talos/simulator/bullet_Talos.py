@@ -287,6 +287,25 @@ class TalosDeburringSimulator:
             ],
         )
 
+    def stepMultiple(self, torques, numSteps):
+        """Do several steps of simulation with the same torques
+
+        The base position is only fetched after the last step.
+        """
+        robotId = self.robotId
+        controlledJoints = self.bullet_controlledJoints
+        setJointMotorControlArray = p.setJointMotorControlArray
+        stepSimulation = p.stepSimulation
+        for _ in range(numSteps):
+            setJointMotorControlArray(
+                robotId,
+                controlledJoints,
+                controlMode=p.TORQUE_CONTROL,
+                forces=torques,
+            )
+            stepSimulation()
+        self.baseRobot = np.array(p.getBasePositionAndOrientation(robotId)[0])
+
     def _applyTorques(self, torques):
         """Apply computed torques to the robot"""
         p.setJointMotorControlArray(
@@ -296,8 +315,11 @@ class TalosDeburringSimulator:
             forces=torques,
         )
 
-    def reset(self, target_position, seed=None):
-        """Reset robot to initial configuration"""
+    def reset(self, target_position, seed=None, np_random=np.random):
+        """Reset robot to initial configuration
+
+        np_random is the PRNG used to sample the random initial configuration
+        """
         # Reset base
         p.resetBasePositionAndOrientation(
             self.robotId,
@@ -319,16 +341,16 @@ class TalosDeburringSimulator:
             # self.physicsClient,
         )
 
-        self._reset_robot_joints()
+        self._reset_robot_joints(np_random)
         self.createTargetVisual(target_position)
 
-    def _reset_robot_joints(self):
+    def _reset_robot_joints(self, np_random=np.random):
         for i in range(len(self.initial_joint_positions)):
             if (
                 self.bulletJointsIdInPinOrder[i] in self.bullet_controlledJoints
                 and self.random_init
             ):
-                init_pos = np.random.uniform(
+                init_pos = np_random.uniform(
                     low=self.lower_joint_bound[i],
                     high=self.upper_joint_bound[i],
                 )
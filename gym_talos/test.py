@@ -3,7 +3,7 @@ import os
 import numpy as np
 
 from gym_talos.simulator.bullet_Talos import TalosDeburringSimulator
-from gym_talos.utils.modelLoader import TalosDesigner
+from gym_talos.utils.modelLoader import TalosDesigner, configure_debug_printing
 
 from stable_baselines3.common.env_checker import check_env
 from stable_baselines3.common.env_util import make_vec_env
@@ -11,6 +11,8 @@ from .envs.env_talos_mpc_deburring import EnvTalosMPC
 
 from IPython import embed
 
+configure_debug_printing()
+
 # Parsing configuration file
 dir_path = os.path.dirname(os.path.realpath(__file__))
 filename = "/../config/config_MPC_RL.yaml"
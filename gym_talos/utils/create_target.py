@@ -34,11 +34,14 @@ class TargetGoal:
                 3
             ] * np.ones(3)
 
-    def create_sphere(self):
-        """Create a sphere target position for the environment"""
-        phi = np.random.uniform(0, 2 * np.pi)
-        theta = np.arccos(np.random.uniform(-1, 1))
-        u = np.random.uniform(0, self._range_target[3])
+    def create_sphere(self, np_random=np.random):
+        """Create a sphere target position for the environment
+
+        :param np_random: PRNG used to sample the target
+        """
+        phi = np_random.uniform(0, 2 * np.pi)
+        theta = np.arccos(np_random.uniform(-1, 1))
+        u = np_random.uniform(0, self._range_target[3])
         return np.array(
             [
                 self._range_target[0] + u * np.sin(theta) * np.cos(phi),
@@ -47,28 +50,35 @@ class TargetGoal:
             ],
         )
 
-    def create_box(self):
-        """Create a box target position for the environment"""
+    def create_box(self, np_random=np.random):
+        """Create a box target position for the environment
+
+        :param np_random: PRNG used to sample the target
+        """
         size_low = self._range_target[3:6]
         size_high = self._range_target[6:9]
 
         return np.array(
             [
-                self._range_target[0] + np.random.uniform(size_low[0], size_high[0]),
-                self._range_target[1] + np.random.uniform(size_low[1], size_high[1]),
-                self._range_target[2] + np.random.uniform(size_low[2], size_high[2]),
+                self._range_target[0] + np_random.uniform(size_low[0], size_high[0]),
+                self._range_target[1] + np_random.uniform(size_low[1], size_high[1]),
+                self._range_target[2] + np_random.uniform(size_low[2], size_high[2]),
             ],
         )
 
-    def create_target(self):
-        """Create a target position for the environment"""
+    def create_target(self, np_random=np.random):
+        """Create a target position for the environment
+
+        :param np_random: PRNG used to sample the target, the global NumPy PRNG
+            by default
+        """
 
         if self._type_target == "fixed":
-            self.position_target = self.range
+            self.position_target = self._range_target.copy()
         elif self._type_target == "box":
-            self.position_target = self.create_box()
+            self.position_target = self.create_box(np_random)
         elif self._type_target == "sphere":
-            self.position_target = self.create_sphere()
+            self.position_target = self.create_sphere(np_random)
         else:
             msg = "Unknown target type"
             raise ValueError(msg)
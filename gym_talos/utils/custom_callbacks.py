@@ -1,13 +1,37 @@
+import atexit
+import copy
+import multiprocessing as mp
+import pathlib
 import shutil
+import signal
+import traceback
 import gymnasium as gym
 import numpy as np
+import torch
 
 from stable_baselines3.common.callbacks import BaseCallback
-from collections import deque
-from stable_baselines3.common.utils import safe_mean
-from typing import Optional
+from stable_baselines3.common.vec_env import SubprocVecEnv
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper
+from typing import Callable, List, Optional
 from .create_target import TargetGoal
 
+# Evaluation targets already drawn in this process, by target type, range and seed
+_TARGETS_CACHE = {}
+# Seconds given to the evaluation process to stop and close its environments
+_EVAL_STOP_TIMEOUT = 10
+
+
+def _copy_config(src: str, dst: str) -> None:
+    """Copy the configuration file of the training next to its logs
+
+    The file is left untouched if it already exists.
+
+    :param src: path of the configuration file
+    :param dst: destination path
+    """
+    if not pathlib.Path(dst).exists():
+        shutil.copy(src, dst)
+
 
 class TensorboardCallback(BaseCallback):
     """
@@ -17,7 +41,10 @@ class TensorboardCallback(BaseCallback):
     def __init__(self, stats_window_size: int = 100, verbose: int = 0):
         super().__init__(verbose)
         self._stats_window_size = stats_window_size
-        self._custom_info_buffer = None
+        # Ring buffer of the last step infos: torque, distance, distance to init
+        self._stats = np.empty((stats_window_size, 3), dtype=np.float32)
+        self._buf_idx = 0
+        self._buf_count = 0
         self._episode_num = 0
 
     def _init_callback(self) -> None:
@@ -28,13 +55,13 @@ class TensorboardCallback(BaseCallback):
         This method will be called by the model after each call to `env.step()`.
         :return: (bool) If the callback returns False, training is aborted early.
         """
-        self._update_info_buffer(self.locals["infos"][0])
-        if self.locals["dones"][0]:
+        infos0 = self.locals["infos"][0]
+        done0 = self.locals["dones"][0]
+        log_interval = self.locals["log_interval"]
+        self._update_info_buffer(infos0)
+        if done0:
             self._episode_num += 1
-            if (
-                self.locals["log_interval"] is not None
-                and self._episode_num % self.locals["log_interval"] == 0
-            ):
+            if log_interval is not None and self._episode_num % log_interval == 0:
                 self._dump_logs()
 
     def _on_training_start(self) -> None:
@@ -67,23 +94,11 @@ class TensorboardCallback(BaseCallback):
         """
         Write log.
         """
-        if len(self._custom_info_buffer) > 0:
-            self.logger.record(
-                "z_custom/torque_mean",
-                safe_mean([ep_info["torque"] for ep_info in self._custom_info_buffer]),
-            )
-            self.logger.record(
-                "z_custom/to_reach_mean",
-                safe_mean(
-                    [ep_info["to_reach"] for ep_info in self._custom_info_buffer],
-                ),
-            )
-            self.logger.record(
-                "z_custom/from_init_mean",
-                safe_mean(
-                    [ep_info["from_init"] for ep_info in self._custom_info_buffer],
-                ),
-            )
+        if self._buf_count > 0:
+            means = self._stats[: self._buf_count].mean(axis=0)
+            self.logger.record("z_custom/torque_mean", float(means[0]))
+            self.logger.record("z_custom/to_reach_mean", float(means[1]))
+            self.logger.record("z_custom/from_init_mean", float(means[2]))
         ## If we want saves more frequently we can with the following command
         # self.logger.dump(step=self.num_timesteps)
         return True
@@ -93,13 +108,10 @@ class TensorboardCallback(BaseCallback):
         Update the buffer for episode infos.
         :param infos: ([dict]) List of infos
         """
-        temp_dict = {}
-        if self._custom_info_buffer is None:
-            self._custom_info_buffer = deque(maxlen=self._stats_window_size)
-        temp_dict["torque"] = infos["tor"]
-        temp_dict["to_reach"] = infos["dst"]
-        temp_dict["from_init"] = infos["init"]
-        self._custom_info_buffer.extend([temp_dict])
+        idx = self._buf_idx
+        self._stats[idx] = (infos["tor"], infos["dst"], infos["init"])
+        self._buf_idx = (idx + 1) % self._stats_window_size
+        self._buf_count = min(self._buf_count + 1, self._stats_window_size)
 
 
 class SaveCallback(BaseCallback):
@@ -120,6 +132,7 @@ class SaveCallback(BaseCallback):
         training_name: Optional[str] = None,
         check_freq: int = 1000,
         verbose: int = 0,
+        stats_window_size: int = 100,
     ):
         super().__init__(verbose)
         self.check_freq = check_freq
@@ -127,6 +140,12 @@ class SaveCallback(BaseCallback):
         self.save_path = None
         self.config_filename = config_filename
         self.training_name = training_name
+        self._stats_window_size = stats_window_size
+        # Ring buffer of the last episodes rewards and their running sum
+        self._ep_info_buffer = np.zeros(stats_window_size)
+        self._ep_info_idx = 0
+        self._ep_info_count = 0
+        self._ep_info_sum = 0.0
 
     def _on_training_start(self) -> None:
         """
@@ -134,21 +153,20 @@ class SaveCallback(BaseCallback):
         """
         if self.save_path is None:
             self.save_path = self.locals["self"].logger.dir
-            shutil.copy(
+            _copy_config(
                 self.config_filename,
                 self.save_path + "/" + self.training_name + ".yaml",
             )
 
     def _on_step(self) -> bool:
-        try:
-            self._update_info_buffer_save(self.locals["infos"][0]["episode"])
-        except:  # noqa: E722
-            pass
+        ep = self.locals["infos"][0].get("episode")
+        if ep is not None:
+            self._update_info_buffer_save(ep)
         if self.n_calls % self.check_freq == 0:
             # Retrieve training reward
-            if len(self._ep_info_buffer) > 0:
+            if self._ep_info_count > 0:
                 # Mean training reward over the last 100 episodes
-                mean_reward = safe_mean(list(self._ep_info_buffer))
+                mean_reward = self._ep_info_sum / self._ep_info_count
                 # New best model, you could save the agent here
                 if mean_reward > self.best_mean_reward:
                     self.best_mean_reward = mean_reward
@@ -161,6 +179,19 @@ class SaveCallback(BaseCallback):
                     self.model.save(self.save_path + "/" + "best_model.zip")
         return True
 
+    def _update_info_buffer_save(self, infos):
+        """
+        Update the buffer for episode infos.
+        :param infos: ([dict]) List of infos
+        """
+        idx = self._ep_info_idx
+        reward = infos["r"]
+        # The evicted slot is still zero until the buffer is full
+        self._ep_info_sum += reward - self._ep_info_buffer[idx]
+        self._ep_info_buffer[idx] = reward
+        self._ep_info_idx = (idx + 1) % self._stats_window_size
+        self._ep_info_count = min(self._ep_info_count + 1, self._stats_window_size)
+
 
 class AllCallbacks(BaseCallback):
     def __init__(
@@ -170,7 +201,9 @@ class AllCallbacks(BaseCallback):
         stats_window_size: int = 100,
         check_freq: int = 1000,
         verbose: int = 0,
-        env: gym.Env = None,
+        eval_env_fns: Optional[List[Callable[[], gym.Env]]] = None,
+        params_env: Optional[dict] = None,
+        eval_seed: Optional[int] = None,
     ):
         super().__init__(verbose)
         self.check_freq = check_freq
@@ -178,14 +211,30 @@ class AllCallbacks(BaseCallback):
         self.training_name = training_name
         self.best_mean_reward = -np.inf
         self._stats_window_size = stats_window_size
-        self.env = env
-        self.eval_on_training = None
-        self._custom_info_buffer = None
+        self.eval_env_fns = eval_env_fns
+        self.params_env = params_env
+        self.eval_seed = eval_seed
+        self._eval_process = None
+        self._eval_queue_in = None
+        self._eval_queue_out = None
+        self._eval_pending = False
+        # Ring buffer of the last step infos: torque, distance, distance to init
+        self._stats = np.empty((stats_window_size, 3), dtype=np.float32)
+        self._buf_idx = 0
+        self._buf_count = 0
         self._episode_num = 0
-        self._ep_info_buffer = None
+        # Ring buffer of the last episodes rewards and their running sum
+        self._ep_info_buffer = np.zeros(stats_window_size)
+        self._ep_info_idx = 0
+        self._ep_info_count = 0
+        self._ep_info_sum = 0.0
         self.save_path = None
+        # Ring buffers of the last episodes final and minimal distances
         self._ep_end_buffer = None
         self._ep_dst_min_buffer = None
+        self._ep_window_size = None
+        self._ep_idx = 0
+        self._ep_count = 0
         self._dst_min = None
 
     def _on_training_start(self) -> None:
@@ -193,93 +242,170 @@ class AllCallbacks(BaseCallback):
         This method is called before the first rollout starts.
         """
         self.save_path = self.locals["self"].logger.dir
-        shutil.copy(
+        _copy_config(
             self.config_filename,
             self.save_path + "/" + self.training_name + ".yaml",
         )
+        if self.eval_env_fns is not None:
+            self._start_eval_process()
 
-    def _on_step_save(self) -> bool:
-        try:
-            self._update_info_buffer_save(self.locals["infos"][0]["episode"])
-        except:  # noqa: E722
-            pass
-        if self.n_calls % self.check_freq == 0:
-            # Retrieve training reward
-            if self._ep_info_buffer is not None:
-                if len(self._ep_info_buffer) > 0:
-                    # Mean training reward over the last 100 episodes
-                    mean_reward = safe_mean(
-                        list(self._ep_info_buffer),
-                    )
-                    # New best model, you could save the agent here
-                    if mean_reward > self.best_mean_reward and mean_reward > 0:
-                        self.best_mean_reward = mean_reward
-                        # Example for saving best model
-                        if self.verbose >= 1:
-                            print(f"Best model found with mean of: {mean_reward:.2f}")
-                            print(
-                                f"New best model at {self.save_path}/best_model.zip",
-                            )
-                        self.model.save(self.save_path + "/" + "best_model.zip")
-
-    def _on_step_tensor(self) -> bool:
+    def _start_eval_process(self) -> None:
+        """
+        Start the process evaluating the agent in the background
+        """
+        start_method = (
+            "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        )
+        ctx = mp.get_context(start_method)
+        self._eval_queue_in = ctx.Queue()
+        self._eval_queue_out = ctx.Queue()
+        self._eval_stop = ctx.Event()
+        self._eval_process = ctx.Process(
+            target=_eval_worker,
+            args=(
+                CloudpickleWrapper(
+                    (copy.deepcopy(self.model.policy), self.eval_env_fns),
+                ),
+                self.params_env,
+                100,
+                self.eval_seed,
+                self._eval_queue_in,
+                self._eval_queue_out,
+                self._eval_stop,
+            ),
+        )
+        self._eval_process.start()
+        # Stop the process when training is interrupted before its end
+        atexit.register(self._stop_eval_process)
+
+    def _stop_eval_process(self) -> None:
+        """
+        Stop the process evaluating the agent
+        """
+        if self._eval_process is None:
+            return
+        if self._eval_process.is_alive():
+            # An evaluation still running is interrupted, its result would be dropped
+            self._eval_stop.set()
+            self._eval_queue_in.put(None)
+            self._eval_process.join(timeout=_EVAL_STOP_TIMEOUT)
+            if self._eval_process.is_alive():
+                self._eval_process.terminate()
+                self._eval_process.join()
+        self._eval_process = None
+        self._eval_pending = False
+
+    def _poll_eval_process(self) -> None:
+        """
+        Record the result of the running evaluation once it is available
+
+        The evaluation is disabled for the rest of the training if it fails.
+        """
+        alive = self._eval_process.is_alive()
+        if not self._eval_queue_out.empty():
+            result = self._eval_queue_out.get()
+            if isinstance(result, str):
+                print(f"Evaluation of the agent failed, it is disabled:\n{result}")
+                self._eval_pending = False
+                self._stop_eval_process()
+            else:
+                self.logger.record("z_custom/eval_reward", result)
+                self._eval_pending = False
+        elif not alive:
+            print("Evaluation process exited unexpectedly, evaluation is disabled")
+            self._stop_eval_process()
+
+    def _on_step(self) -> bool:
         """
         This method will be called by the model after each call to `env.step()`.
         :return: (bool) If the callback returns False, training is aborted early.
         """
-        self._update_info_buffer_tensor(self.locals["infos"][0])
+        infos0 = self.locals["infos"][0]
+        done0 = self.locals["dones"][0]
+        log_interval = self.locals["log_interval"]
+        dst = infos0["dst"]
+        self._update_info_buffer_tensor(infos0)
         if self._dst_min is None:
-            self._dst_min = self.locals["infos"][0]["dst"]
+            self._dst_min = dst
         else:
-            self._dst_min = min(self._dst_min, self.locals["infos"][0]["dst"])
-        if self.locals["dones"][0]:
-            self._episode_num += 1
-            self._ep_end_buffer.extend([self.locals["infos"][0]["dst"]])
-            self._ep_dst_min_buffer.extend([self._dst_min])
-            self._dst_min = None
-            if (
-                self.locals["log_interval"] is not None
-                and self._episode_num % self.locals["log_interval"] == 0
-            ):
-                self._dump_logs_tensor()
-            if self._episode_num % self.check_freq == 0:
-                if self.eval_on_training is None:
-                    self.eval_on_training = EvalOnTraining(
-                        model=self.locals["self"],
-                        eval_env=self.env,
-                        n_eval_episodes=100,
+            self._dst_min = min(self._dst_min, dst)
+        if done0:
+            self._on_episode_end(dst, log_interval)
+        if self._eval_pending:
+            self._poll_eval_process()
+
+        ep = infos0.get("episode")
+        if ep is not None:
+            self._update_info_buffer_save(ep)
+        if self.n_calls % self.check_freq == 0:
+            self._save_best_model()
+        return True
+
+    def _on_episode_end(self, dst, log_interval) -> None:
+        """
+        Record the distances of the episode which just ended and start the
+        evaluation of the agent when it is due.
+        :param dst: distance to the target at the end of the episode
+        :param log_interval: number of episodes between two logs
+        """
+        self._episode_num += 1
+        idx = self._ep_idx
+        self._ep_end_buffer[idx] = dst
+        self._ep_dst_min_buffer[idx] = self._dst_min
+        self._ep_idx = (idx + 1) % self._ep_window_size
+        self._ep_count = min(self._ep_count + 1, self._ep_window_size)
+        self._dst_min = None
+        if log_interval is not None and self._episode_num % log_interval == 0:
+            self._dump_logs_tensor()
+        if (
+            self._episode_num % self.check_freq == 0
+            and self._eval_process is not None
+            and not self._eval_pending
+        ):
+            # Evaluations requested while the previous one is running are skipped
+            self._eval_queue_in.put(
+                {
+                    key: value.detach().clone()
+                    for key, value in self.model.policy.state_dict().items()
+                },
+            )
+            self._eval_pending = True
+
+    def _save_best_model(self) -> None:
+        """
+        Save the model if the mean training reward is the best one so far.
+        """
+        # Retrieve training reward
+        if self._ep_info_count > 0:
+            # Mean training reward over the last 100 episodes
+            mean_reward = self._ep_info_sum / self._ep_info_count
+            # New best model, you could save the agent here
+            if mean_reward > self.best_mean_reward and mean_reward > 0:
+                self.best_mean_reward = mean_reward
+                # Example for saving best model
+                if self.verbose >= 1:
+                    print(f"Best model found with mean of: {mean_reward:.2f}")
+                    print(
+                        f"New best model at {self.save_path}/best_model.zip",
                     )
-                eval_reward = self.eval_on_training.eval_on_train()
-                self.logger.record("z_custom/eval_reward", eval_reward)
+                self.model.save(self.save_path + "/" + "best_model.zip")
 
     def _dump_logs_tensor(self) -> None:
         """
         Write log.
         """
-        if len(self._custom_info_buffer) > 0:
-            self.logger.record(
-                "z_custom/torque_mean",
-                safe_mean([ep_info["torque"] for ep_info in self._custom_info_buffer]),
-            )
-            self.logger.record(
-                "z_custom/to_reach_mean",
-                safe_mean(
-                    [ep_info["to_reach"] for ep_info in self._custom_info_buffer],
-                ),
-            )
-            self.logger.record(
-                "z_custom/from_init_mean",
-                safe_mean(
-                    [ep_info["from_init"] for ep_info in self._custom_info_buffer],
-                ),
-            )
+        if self._buf_count > 0:
+            means = self._stats[: self._buf_count].mean(axis=0)
+            self.logger.record("z_custom/torque_mean", float(means[0]))
+            self.logger.record("z_custom/to_reach_mean", float(means[1]))
+            self.logger.record("z_custom/from_init_mean", float(means[2]))
             self.logger.record(
                 "z_custom/final_dt",
-                safe_mean(list(self._ep_end_buffer)),
+                float(self._ep_end_buffer[: self._ep_count].mean()),
             )
             self.logger.record(
                 "z_custom/min_dt",
-                safe_mean(list(self._ep_dst_min_buffer)),
+                float(self._ep_dst_min_buffer[: self._ep_count].mean()),
             )
 
         # self.logger.dump(step=self.num_timesteps)
@@ -290,67 +416,200 @@ class AllCallbacks(BaseCallback):
         Update the buffer for episode infos.
         :param infos: ([dict]) List of infos
         """
-        temp_dict = {}
-        if self._custom_info_buffer is None:
-            self._custom_info_buffer = deque(maxlen=self._stats_window_size)
         if self._ep_end_buffer is None:
-            self._ep_end_buffer = deque(maxlen=self.locals["log_interval"])
-        if self._ep_dst_min_buffer is None:
-            self._ep_dst_min_buffer = deque(maxlen=self.locals["log_interval"])
-        temp_dict["torque"] = infos["tor"]
-        temp_dict["to_reach"] = infos["dst"]
-        temp_dict["from_init"] = infos["init"]
-        self._custom_info_buffer.extend([temp_dict])
+            self._ep_window_size = (
+                self.locals["log_interval"] or self._stats_window_size
+            )
+            self._ep_end_buffer = np.empty(self._ep_window_size, dtype=np.float32)
+            self._ep_dst_min_buffer = np.empty(self._ep_window_size, dtype=np.float32)
+        idx = self._buf_idx
+        self._stats[idx] = (infos["tor"], infos["dst"], infos["init"])
+        self._buf_idx = (idx + 1) % self._stats_window_size
+        self._buf_count = min(self._buf_count + 1, self._stats_window_size)
 
     def _update_info_buffer_save(self, infos):
         """
         Update the buffer for episode infos.
         :param infos: ([dict]) List of infos
         """
-        if self._ep_info_buffer is None:
-            self._ep_info_buffer = deque(maxlen=self._stats_window_size)
-        self._ep_info_buffer.extend([infos["r"]])
+        idx = self._ep_info_idx
+        reward = infos["r"]
+        # The evicted slot is still zero until the buffer is full
+        self._ep_info_sum += reward - self._ep_info_buffer[idx]
+        self._ep_info_buffer[idx] = reward
+        self._ep_info_idx = (idx + 1) % self._stats_window_size
+        self._ep_info_count = min(self._ep_info_count + 1, self._stats_window_size)
 
-    def _on_step(self) -> bool:
-        self._on_step_tensor()
-        self._on_step_save()
-        return True
+    def _on_training_end(self) -> None:
+        """
+        This event is triggered before exiting the `learn()` method.
+        """
+        self._stop_eval_process()
+
+
+def _eval_worker(
+    policy_and_env_fns,
+    params_env,
+    n_eval_episodes,
+    seed,
+    queue_in,
+    queue_out,
+    stop_event,
+):
+    """
+    Evaluate the agent in a background process
+
+    Each set of parameters of the policy received from ``queue_in`` is evaluated
+    and the mean reward is sent back through ``queue_out``. The process stops when
+    it receives None or when ``stop_event`` is set, interrupting the running
+    evaluation, or after sending back the traceback of an error.
+
+    :param policy_and_env_fns: Wrapped copy of the policy and functions creating
+        the environments used for evaluation
+    :param params_env: The parameters of the environment, used to sample targets
+    :param n_eval_episodes: The number of episodes to evaluate the agent
+    :param seed: The seed of the PRNG used to sample targets
+    :param queue_in: Queue of the parameters of the policy to evaluate
+    :param queue_out: Queue of the evaluation rewards
+    :param stop_event: Event set by the training process to stop the evaluation
+    """
+    # Leave the cores to the training process
+    torch.set_num_threads(1)
+    # CTRL+C is handled by the training process, which stops this one through
+    # stop_event so that the evaluation environments are closed
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    eval_on_training = None
+    try:
+        policy, env_fns = policy_and_env_fns.var
+        eval_on_training = EvalOnTraining(
+            model=policy,
+            env_fns=env_fns,
+            params_env=params_env,
+            n_eval_episodes=n_eval_episodes,
+            seed=seed,
+            stop_event=stop_event,
+        )
+        while True:
+            state_dict = queue_in.get()
+            if state_dict is None:
+                break
+            policy.load_state_dict(state_dict)
+            mean_reward = eval_on_training.eval_on_train()
+            if mean_reward is None:
+                break
+            queue_out.put(mean_reward)
+    except Exception:
+        queue_out.put(traceback.format_exc())
+    finally:
+        if eval_on_training is not None:
+            eval_on_training.close()
 
 
 class EvalOnTraining:
     """
     Callback for evaluating an agent during training.
 
-    :param eval_env: The environment used for initialization
+    The episodes are run in parallel by a set of environments, each in its own
+    process.
+
+    :param model: The model or policy to evaluate
+    :param env_fns: Functions creating the environments used for evaluation
+    :param params_env: The parameters of the environment, used to sample targets
     :param n_eval_episodes: The number of episodes to evaluate the agent
+    :param seed: The seed of the PRNG used to sample targets
+    :param stop_event: Event interrupting the evaluation once set
     """
 
-    def __init__(self, model, eval_env, n_eval_episodes=100):
+    def __init__(
+        self,
+        model,
+        env_fns,
+        params_env,
+        n_eval_episodes=100,
+        seed=None,
+        stop_event=None,
+    ):
         self.model = model
-        self.eval_env = eval_env
+        self.vec_env = SubprocVecEnv(env_fns)
         self.n_eval_episodes = n_eval_episodes
-        self.target_builder = TargetGoal(self.eval_env.params_env)
-        self.targets = []
-        self._define_targets()
+        self.stop_event = stop_event
+        self.target_builder = TargetGoal(params_env)
+        self.seed = seed
+        self._np_random = np.random.default_rng(seed)
+        self._target_iter = None
 
     def _define_targets(self):
-        for _ in range(self.n_eval_episodes):
-            self.target_builder.create_target()
-            self.targets.append(self.target_builder.position_target)
+        """Yields the target of each new episode
 
-    def eval_on_train(self) -> None:
+        The targets are drawn on first use and shared by all the evaluations
+        running on the same target range with the same seed.
+        """
+        key = (
+            self.target_builder.type_target,
+            self.target_builder.range_target.tobytes(),
+            self.seed,
+        )
+        targets = _TARGETS_CACHE.setdefault(key, [])
+        i = 0
+        while True:
+            if i == len(targets):
+                self.target_builder.create_target(self._np_random)
+                targets.append(self.target_builder.position_target)
+            yield targets[i]
+            i += 1
+
+    def _reset_on_target(self, obs, env_idx, target):
+        """
+        Reset one of the environments on a given target
+
+        :param obs: Observations of all the environments, updated in place
+        :param env_idx: Index of the environment to reset
+        :param target: Target of the new episode
+        """
+        env_obs, _ = self.vec_env.env_method(
+            "reset",
+            options={"target": target},
+            indices=[env_idx],
+        )[0]
+        for key, value in env_obs.items():
+            obs[key][env_idx] = value
+
+    def eval_on_train(self) -> Optional[float]:
         """
         This method will evaluate the agent during training
+
+        Each environment runs its share of the episodes, the policy is queried
+        once per step for all the environments.
+
+        :return: The mean reward of the episodes, None if the evaluation was
+            interrupted by the stop event
         """
+        n_envs = self.vec_env.num_envs
+        self._target_iter = self._define_targets()
+        n_episodes = np.array(
+            [(self.n_eval_episodes + n_envs - 1 - i) // n_envs for i in range(n_envs)],
+        )
+        episode_counts = np.zeros(n_envs, dtype=int)
+        episode_rewards = np.zeros(n_envs)
         eval_rewards = []
-        for _ in range(self.n_eval_episodes):
-            episode_reward = 0.0
-            done = False
-            obs, _ = self.eval_env.reset(options={"target": self.targets[0]})
-            while not done:
-                action, _ = self.model.predict(obs, deterministic=True)
-                obs, reward, terminated, truncated, infos = self.eval_env.step(action)
-                episode_reward += reward
-                done = True if terminated or truncated else False
-            eval_rewards.append(episode_reward)
+
+        obs = self.vec_env.reset()
+        for i in np.flatnonzero(n_episodes):
+            self._reset_on_target(obs, i, next(self._target_iter))
+        while (episode_counts < n_episodes).any():
+            if self.stop_event is not None and self.stop_event.is_set():
+                return None
+            actions, _ = self.model.predict(obs, deterministic=True)
+            obs, rewards, dones, _ = self.vec_env.step(actions)
+            episode_rewards += rewards
+            for i in np.flatnonzero(dones & (episode_counts < n_episodes)):
+                eval_rewards.append(episode_rewards[i])
+                episode_counts[i] += 1
+                if episode_counts[i] < n_episodes[i]:
+                    self._reset_on_target(obs, i, next(self._target_iter))
+            episode_rewards[dones] = 0
         return np.mean(eval_rewards)
+
+    def close(self):
+        """Shuts down the evaluation environments"""
+        self.vec_env.close()
@@ -0,0 +1,112 @@
+"""Numerical kernels evaluated at each step of the environment
+
+The kernels are compiled with Numba when it is installed, otherwise their NumPy
+implementations are used.
+"""
+import math
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _truncation_kernel(
+    q,
+    v,
+    upperPosLim,
+    lowerPosLim,
+    velLim,
+    rCoM,
+    lowerLimitPos,
+    upperLimitPos,
+):
+    """Checks the balance and the kinematic limits of the robot
+
+    :param q: joints positions
+    :param v: joints velocities
+    :param upperPosLim: upper limit of the joints positions
+    :param lowerPosLim: lower limit of the joints positions
+    :param velLim: limit of the absolute joints velocities
+    :param rCoM: position of the CoM
+    :param lowerLimitPos: lower limit of the position of the CoM
+    :param upperLimitPos: upper limit of the position of the CoM
+    :return: True if a constraint is infriged, False otherwise
+    """
+    for i in range(rCoM.shape[0]):
+        if rCoM[i] < lowerLimitPos[i] or rCoM[i] > upperLimitPos[i]:
+            return True
+    for i in range(q.shape[0]):
+        if q[i] > upperPosLim[i] or q[i] < lowerPosLim[i]:
+            return True
+    for i in range(v.shape[0]):
+        if abs(v[i]) > velLim[i]:
+            return True
+    return False
+
+
+def _reward_kernel(q, qC0, weights, torques, achieved_goal, desired_goal):
+    """Computes the terms of the step reward
+
+    :param q: joints positions
+    :param qC0: initial joints positions
+    :param weights: weights of the distance to the initial configuration
+    :param torques: torque vector
+    :param achieved_goal: position of the end-effector
+    :param desired_goal: position of the target
+    :return: norm of the torques, weighted distance to the initial
+        configuration and distance of the end-effector to the target
+    """
+    torque_sq = 0.0
+    for i in range(torques.shape[0]):
+        torque_sq += torques[i] * torques[i]
+    len_to_init = 0.0
+    for i in range(q.shape[0]):
+        dq = qC0[i] - q[i]
+        len_to_init += weights[i] * dq * dq
+    dst_sq = 0.0
+    for i in range(achieved_goal.shape[0]):
+        d = achieved_goal[i] - desired_goal[i]
+        dst_sq += d * d
+    return np.sqrt(torque_sq), len_to_init, np.sqrt(dst_sq)
+
+
+def _truncation_numpy(
+    q,
+    v,
+    upperPosLim,
+    lowerPosLim,
+    velLim,
+    rCoM,
+    lowerLimitPos,
+    upperLimitPos,
+):
+    """NumPy implementation of the truncation kernel"""
+    return bool(
+        (rCoM < lowerLimitPos).any()
+        or (rCoM > upperLimitPos).any()
+        or (q > upperPosLim).any()
+        or (q < lowerPosLim).any()
+        or (np.abs(v) > velLim).any(),
+    )
+
+
+def _reward_numpy(q, qC0, weights, torques, achieved_goal, desired_goal):
+    """NumPy implementation of the reward kernel"""
+    dq = qC0 - q
+    d = achieved_goal - desired_goal
+    return (
+        math.sqrt(torques @ torques),
+        float(weights @ (dq * dq)),
+        math.sqrt(d @ d),
+    )
+
+
+if njit is not None:
+    truncation_kernel = njit(cache=True)(_truncation_kernel)
+    reward_kernel = njit(cache=True)(_reward_kernel)
+else:
+    truncation_kernel = _truncation_numpy
+    reward_kernel = _reward_numpy
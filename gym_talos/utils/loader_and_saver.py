@@ -1,11 +1,32 @@
-from typing import Optional
+import pathlib
+from typing import Callable, Optional, Union
 import gymnasium
+import numpy as np
+import yaml
 from stable_baselines3 import HerReplayBuffer
 from stable_baselines3.common.env_util import SubprocVecEnv
 from stable_baselines3.common.monitor import Monitor
 from stable_baselines3.common.base_class import BaseAlgorithm
 from stable_baselines3.common.buffers import DictReplayBuffer
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+def load_config(path: Union[str, pathlib.Path]) -> dict:
+    """
+    This function loads a configuration file
+
+    The C implementation of the YAML loader is used when it is available.
+
+    :param path: The path of the yaml file
+    :return: The parameters read from the file
+    """
+    with pathlib.Path(path).open() as config_file:
+        return yaml.load(config_file, Loader=SafeLoader)
+
 
 def saver(
     training_name: str,
@@ -41,6 +62,36 @@ def handler(
     exit(1)
 
 
+def make_env(
+    env_class: gymnasium.Env,
+    env_params: dict,
+    designer_params: dict,
+    rank: int = 0,
+    seed: Optional[int] = None,
+    GUI: bool = False,
+) -> Callable[[], gymnasium.Env]:
+    """
+    This function returns a factory building one environment of a vectorized set
+
+    The environment is only built when the factory is called, i.e. inside the
+    worker process when used with a ``SubprocVecEnv``.
+
+    :param env_class: The class of the environment to be used
+    :param env_params: The parameters of the environment saved in a yaml file
+    :param designer_params: The parameters of the designer saved in a yaml file
+    :param rank: The index of the environment in the vectorized set
+    :param seed: The base seed, the environment is seeded with ``seed + rank``
+    :param GUI: Whether or not to display the GUI
+    :return: The factory creating the environment
+    """
+
+    def _init() -> gymnasium.Env:
+        env_seed = None if seed is None else seed + rank
+        return Monitor(env_class(designer_params, env_params, GUI=GUI, seed=env_seed))
+
+    return _init
+
+
 def setup_env(
     env_class: gymnasium.Env,
     env_params: dict,
@@ -50,6 +101,9 @@ def setup_env(
     """
     This function creates the environment used for training
 
+    When several environments are requested, they are stepped in parallel in
+    separate processes, each with its own seed.
+
     :param env_class: The class of the environment to be used
     :param env_params: The parameters of the environment saved in a yaml file
     :param designer_params: The parameters of the designer saved in a yaml file
@@ -57,10 +111,21 @@ def setup_env(
     :return: The environment created
     """
     if env_params["nb_environments"] == 1:
-        return env_class(designer_params, env_params, GUI=GUI)
+        return env_class(
+            designer_params,
+            env_params,
+            GUI=GUI,
+            seed=env_params.get("seed"),
+        )
+    seed = env_params.get("seed")
+    if seed is None:
+        # Forked workers share the PRNG state of the parent process
+        seed = int(np.random.randint(0, 2**31 - env_params["nb_environments"]))
     return SubprocVecEnv(
-        env_params["nb_environments"]
-        * [lambda: Monitor(env_class(designer_params, env_params, GUI=False))],
+        [
+            make_env(env_class, env_params, designer_params, rank=i, seed=seed)
+            for i in range(env_params["nb_environments"])
+        ],
     )
 
 
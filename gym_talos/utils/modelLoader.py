@@ -1,10 +1,16 @@
-from collections import deque
 import example_robot_data
 import numpy as np
 import pinocchio as pin
 
-pin.SE3.__repr__ = pin.SE3.__str__
-np.set_printoptions(precision=3, linewidth=300, suppress=True, threshold=10000)
+
+def configure_debug_printing():
+    """Make NumPy arrays and Pinocchio placements readable when printed
+
+    This changes global printing options, it is meant to be called from
+    debugging scripts only.
+    """
+    pin.SE3.__repr__ = pin.SE3.__str__
+    np.set_printoptions(precision=3, linewidth=300, suppress=True, threshold=10000)
 
 
 class TalosDesigner:
@@ -37,6 +43,7 @@ class TalosDesigner:
         # self._addshoulder()
 
         self._buildReducedModel(controlledJoints)
+        self._initReducedModel()
 
     def _refineModel(self, model, SRDF):
         """Load additional information from SRDF file
@@ -84,38 +91,47 @@ class TalosDesigner:
 
         :param controlledJoints List of the joints to control
         """
-        self.q0Complete = self.rmodelComplete.referenceConfigurations["half_sitting"]
-        self.z_c = self.q0Complete[2]
-        self.g = self.gravity[2]
-        self._buffer_CoM = deque(maxlen=3)
-        self.base_translation_bullet_pinocchio = np.array([-0.08222, 0.00838, -0.07261])
-        self.base_robot_bullet_SE3_origin_robot_pinocchio = pin.SE3(
-            np.eye(3),
-            self.q0Complete[:3] + self.base_translation_bullet_pinocchio,
-        ).inverse()
+        q0Complete = self.rmodelComplete.referenceConfigurations["half_sitting"]
+        names = list(self.rmodelComplete.names)
+        name_to_id = {n: i for (i, n) in enumerate(names)}
+        controlled_set = set(controlledJointsName)
         # Check that controlled joints belong to model
         for joint in controlledJointsName:
-            if joint not in self.rmodelComplete.names:
+            if joint not in name_to_id:
                 print("ERROR")
 
         self.controlledJointsID = [
-            i
-            for (i, n) in enumerate(self.rmodelComplete.names)
-            if n in controlledJointsName
+            i for (i, n) in enumerate(names) if n in controlled_set
         ]
 
         # Make list of blocked joints
         lockedJointsID = [
-            self.rmodelComplete.getJointId(joint)
-            for joint in self.rmodelComplete.names[1:]
-            if joint not in controlledJointsName
+            name_to_id[joint] for joint in names[1:] if joint not in controlled_set
         ]
 
         self.rmodel = pin.buildReducedModel(
             self.rmodelComplete,
             lockedJointsID,
-            self.q0Complete,
+            q0Complete,
         )
+
+    def _initReducedModel(self):
+        """Initialize the data and buffers used along with the reduced model"""
+        self.q0Complete = self.rmodelComplete.referenceConfigurations["half_sitting"]
+        self.z_c = self.q0Complete[2]
+        self.g = self.gravity[2]
+        # Last three CoM positions, the oldest one is at _com_idx once filled
+        self._com_hist = np.zeros((3, 2))
+        self._com_idx = 0
+        self._com_count = 0
+        self._zmp_coeff = 0.01 * self.z_c / (self.g * self.dt * self.dt)
+        self._ee_out = np.empty(3)
+        self._CoM = np.empty(3)
+        self.base_translation_bullet_pinocchio = np.array([-0.08222, 0.00838, -0.07261])
+        self.base_robot_bullet_SE3_origin_robot_pinocchio = pin.SE3(
+            np.eye(3),
+            self.q0Complete[:3] + self.base_translation_bullet_pinocchio,
+        ).inverse()
         self.rdata = self.rmodel.createData()
 
         # Define a default State
@@ -137,42 +153,57 @@ class TalosDesigner:
             self.world_bullet_SE3_base_robot_bullet
             * self.base_robot_bullet_SE3_origin_robot_pinocchio
         )
-        self._calculate_CoM(x_measured)
+        self._R_origin = np.ascontiguousarray(
+            self.world_bullet_SE3_origin_robot_pin.rotation,
+        )
+        self._t_origin = np.ascontiguousarray(
+            self.world_bullet_SE3_origin_robot_pin.translation,
+        )
+        self._calculate_CoM()
 
         self.oMtool = self.rdata.oMf[self.endEffectorId]
-        self._buffer_CoM.append(self._CoM[:2])
-
-        if len(self._buffer_CoM) == 3:
-            acc = (
-                0.01
-                * (self._buffer_CoM[2] + self._buffer_CoM[0] - 2 * self._buffer_CoM[1])
-                / (self.dt**2)
+        i = self._com_idx
+        self._com_hist[i] = self._CoM[:2]
+        self._com_idx = (i + 1) % 3
+        self._com_count = min(self._com_count + 1, 3)
+
+        if self._com_count == 3:
+            self._ZMP = self._zmp_coeff * (
+                self._com_hist[i]
+                + self._com_hist[self._com_idx]
+                - 2 * self._com_hist[(i + 2) % 3]
             )
-            self._ZMP = self.z_c / self.g * acc
         else:
-            self._ZMP = self._buffer_CoM[0]
+            self._ZMP = self._com_hist[0].copy()
 
-    def _calculate_CoM(self, x_measured):
-        """Compute the CoM position from the robot state"""
+    def _calculate_CoM(self):
+        """Compute the CoM position from the robot state
+
+        Relies on the forward kinematics computed by update_reduced_model
+        """
         local_CoM = pin.centerOfMass(
             self.rmodel,
             self.rdata,
-            x_measured[: self.rmodel.nq],
-        )
-        self._CoM = (
-            self.world_bullet_SE3_origin_robot_pin.rotation @ local_CoM
-            + self.world_bullet_SE3_origin_robot_pin.translation
+            pin.KinematicLevel.POSITION,
+            False,
         )
+        np.dot(self._R_origin, local_CoM, out=self._CoM)
+        self._CoM += self._t_origin
 
     def get_end_effector_pos(self):
-        """Compute the end effector position from the robot state"""
-        return (
-            self.world_bullet_SE3_origin_robot_pin.rotation @ self.oMtool.translation
-            + self.world_bullet_SE3_origin_robot_pin.translation
-        )
+        """Compute the end effector position from the robot state
+
+        The returned array is overwritten by the next call
+        """
+        np.dot(self._R_origin, self.oMtool.translation, out=self._ee_out)
+        self._ee_out += self._t_origin
+        return self._ee_out
 
     def get_CoM(self):
-        """Return the CoM position from the robot state"""
+        """Return the CoM position from the robot state
+
+        The returned array is overwritten by the next update of the model
+        """
         return self._CoM
 
     def get_ZMP(self):